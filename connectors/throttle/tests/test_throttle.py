@@ -0,0 +1,265 @@
+import time
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from importlib.util import module_from_spec, spec_from_loader
+from importlib.machinery import SourceFileLoader
+
+import pytest
+
+import keelson
+from keelson.Envelope_pb2 import Envelope
+from keelson.compression import COMPRESSION_ZSTD, CompressionPolicy
+from keelson.payloads.Primitives_pb2 import TimestampedFloat
+
+_loader = SourceFileLoader(
+    "throttle", str(Path(__file__).parent.parent / "bin" / "throttle")
+)
+throttle = module_from_spec(spec_from_loader("throttle", _loader))
+_loader.exec_module(throttle)
+
+RPM = keelson.construct_pubsub_key("realm", "entity", "rpm", "engine/0")
+RAW = keelson.construct_pubsub_key("realm", "entity", "random_mumbo_jumbo", "0")
+SUBSCRIPTION = "realm/v0/entity/pubsub/**"
+
+
+def make_sample(key, message):
+    return SimpleNamespace(
+        key_expr=key, payload=SimpleNamespace(to_bytes=lambda: message)
+    )
+
+
+def make_float(value):
+    payload = TimestampedFloat()
+    payload.timestamp.FromNanoseconds(time.time_ns())
+    payload.value = value
+    return payload.SerializeToString()
+
+
+class Bridge:
+    """Drives a Throttle, with a running scheduler, and records its output."""
+
+    def __init__(self, rules, **kwargs):
+        self.published = []
+        self.throttle = throttle.Throttle(
+            rules, lambda key, message: self.published.append((key, message)), **kwargs
+        )
+        self._scheduler = threading.Thread(target=self.throttle.run_scheduler)
+        self._scheduler.start()
+
+    def put(self, key, payload, enclosed_at=None, subscription=SUBSCRIPTION):
+        self.throttle.on_sample(
+            subscription, make_sample(key, keelson.enclose(payload, enclosed_at))
+        )
+
+    def uncovered(self):
+        return [
+            (key, enclosed_at, payload)
+            for key, message in self.published
+            for enclosed_at, _, payload in keelson.uncover_all(message)
+        ]
+
+    def values(self):
+        return [
+            TimestampedFloat.FromString(payload).value
+            for _, _, payload in self.uncovered()
+        ]
+
+    def close(self):
+        self.throttle.close()
+        self._scheduler.join()
+
+
+@pytest.fixture
+def bridge():
+    bridges = []
+
+    def _bridge(*rules, **kwargs):
+        bridges.append(
+            Bridge(
+                [throttle.Rule(**{"key": SUBSCRIPTION, **rule}) for rule in rules],
+                **kwargs,
+            )
+        )
+        return bridges[-1]
+
+    yield _bridge
+
+    for created in bridges:
+        created.close()
+
+
+def test_rule_validation():
+    with pytest.raises(ValueError, match="Unknown action"):
+        throttle.Rule(SUBSCRIPTION, "random_mumbo_jumbo")
+    with pytest.raises(ValueError, match="rate"):
+        throttle.Rule(SUBSCRIPTION, "keep_latest")
+    with pytest.raises(ValueError, match="'n'"):
+        throttle.Rule(SUBSCRIPTION, "every_nth", n=0)
+    with pytest.raises(ValueError, match="window"):
+        throttle.Rule(SUBSCRIPTION, "average")
+
+
+def test_every_nth(bridge):
+    b = bridge(dict(action="every_nth", n=3))
+
+    for ix in range(10):
+        b.put(RPM, make_float(ix), enclosed_at=ix + 1)
+
+    assert b.values() == [0, 3, 6, 9]
+    assert [enclosed_at for _, enclosed_at, _ in b.uncovered()] == [1, 4, 7, 10]
+
+
+def test_keep_latest(bridge):
+    b = bridge(dict(action="keep_latest", rate=10))
+
+    for ix in range(5):
+        b.put(RPM, make_float(ix))
+
+    # The first sample of a period is forwarded immediately...
+    assert b.values() == [0]
+
+    # ...and the latest one at the end of the period
+    time.sleep(0.2)
+    assert b.values() == [0, 4]
+
+    # Nothing more to forward
+    time.sleep(0.2)
+    assert b.values() == [0, 4]
+
+    # A new period starts with the next sample
+    b.put(RPM, make_float(5))
+    assert b.values() == [0, 4, 5]
+
+
+def test_average(bridge):
+    b = bridge(dict(action="average", window=0.1))
+
+    for ix, value in enumerate([1.0, 2.0, 6.0]):
+        b.put(RPM, make_float(value), enclosed_at=ix + 1)
+
+    assert not b.published
+
+    time.sleep(0.2)
+    assert b.values() == [3.0]
+    # With the timestamp of the last sample in the window
+    assert b.uncovered()[0][1] == 3
+
+    b.put(RPM, make_float(10.0))
+    time.sleep(0.2)
+    assert b.values() == [3.0, 10.0]
+
+
+def test_on_change_deadband(bridge):
+    b = bridge(dict(action="on_change", deadband=0.5))
+
+    for value in [1.0, 1.2, 1.6, 1.7, 2.2, 2.2]:
+        b.put(RPM, make_float(value))
+
+    assert b.values() == pytest.approx([1.0, 1.6, 2.2])
+
+
+def test_on_change_raw(bridge):
+    b = bridge(dict(action="on_change"))
+
+    for payload in [b"a", b"a", b"b", b"a"]:
+        b.put(RAW, payload)
+
+    assert [payload for _, _, payload in b.uncovered()] == [b"a", b"b", b"a"]
+
+
+def test_average_non_numeric_falls_through(bridge):
+    b = bridge(
+        dict(action="average", window=0.1),
+        dict(action="every_nth", n=1),
+    )
+
+    b.put(RAW, b"bytes")
+    b.put(RPM, make_float(1.0))
+
+    # Bridged by the second rule, while RPM is averaged by the first
+    assert [key for key, _ in b.published] == [RAW]
+    time.sleep(0.2)
+    assert [key for key, _ in b.published] == [RAW, RPM]
+
+
+def test_unmatched_keys_are_ignored(bridge):
+    b = bridge(dict(action="every_nth", n=1, subject="rpm"))
+
+    b.put(RAW, b"bytes")
+    b.put("not/a/keelson/key", b"bytes")
+
+    assert not b.published
+
+
+def test_output_realm(bridge):
+    b = bridge(dict(action="every_nth", n=1), output_realm="shore")
+
+    b.put(RPM, make_float(1.0))
+
+    assert b.published[0][0] == keelson.construct_pubsub_key(
+        "shore", "entity", "rpm", "engine/0"
+    )
+
+
+def test_batched_input_is_rebatched(bridge):
+    b = bridge(dict(action="every_nth", n=2))
+
+    message = keelson.enclose_batch(
+        [(ix + 1, make_float(ix)) for ix in range(6)], enclosed_at=100
+    )
+    b.throttle.on_sample(SUBSCRIPTION, make_sample(RPM, message))
+
+    assert len(b.published) == 1
+    assert Envelope.FromString(b.published[0][1]).batched
+    assert b.values() == [0, 2, 4]
+    assert [enclosed_at for _, enclosed_at, _ in b.uncovered()] == [1, 3, 5]
+
+
+def test_compression(bridge):
+    b = bridge(
+        dict(action="every_nth", n=1),
+        compression_policy=CompressionPolicy(
+            COMPRESSION_ZSTD, threshold=100, subjects=None
+        ),
+    )
+
+    b.put(RAW, b"\x00" * 1000)
+    b.put(RAW, b"\x00" * 10)
+
+    large, small = (Envelope.FromString(message) for _, message in b.published)
+    assert large.compression == COMPRESSION_ZSTD
+    assert len(large.payload) < 1000
+    assert small.compression == Envelope.COMPRESSION_NONE
+    assert [payload for _, _, payload in b.uncovered()] == [
+        b"\x00" * 1000,
+        b"\x00" * 10,
+    ]
+
+
+def test_output_realm_loopback_is_ignored(bridge):
+    subscription = "*/v0/entity/pubsub/**"
+    shore = keelson.construct_pubsub_key("shore", "entity", "rpm", "engine/0")
+
+    b = bridge(dict(key=subscription, action="every_nth", n=1), output_realm="shore")
+
+    b.put(RPM, make_float(1.0), subscription=subscription)
+    # Our own output, as received on the input session
+    b.put(shore, make_float(1.0), subscription=subscription)
+
+    assert [key for key, _ in b.published] == [shore]
+
+
+def test_output_realm_on_separate_session(bridge):
+    subscription = "*/v0/entity/pubsub/**"
+    shore = keelson.construct_pubsub_key("shore", "entity", "rpm", "engine/0")
+
+    b = bridge(
+        dict(key=subscription, action="every_nth", n=1),
+        output_realm="shore",
+        loopback=False,
+    )
+
+    b.put(shore, make_float(1.0), subscription=subscription)
+
+    assert [key for key, _ in b.published] == [shore]
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of compression ratio and CPU cost of the envelope compression codecs
+on real payloads taken from an mcap recording (by default test.mcap in the
+root of this repository).
+
+Requires the mcap package and the compression extras:
+
+`pip install mcap keelson[compression]`
+"""
+
+import time
+import argparse
+from pathlib import Path
+from collections import defaultdict
+from typing import Dict, List
+
+from mcap.reader import make_reader
+
+import keelson
+from keelson.compression import (
+    COMPRESSION_ZSTD,
+    COMPRESSION_LZ4,
+    compress,
+    decompress,
+)
+from keelson.Envelope_pb2 import Envelope
+
+CODECS = {"zstd": COMPRESSION_ZSTD, "lz4": COMPRESSION_LZ4}
+
+DEFAULT_RECORDING = Path(__file__).parents[3] / "test.mcap"
+
+
+def load_payloads(path: Path) -> Dict[str, List[bytes]]:
+    payloads = defaultdict(list)
+    with path.open("rb") as fh:
+        for _, channel, message in make_reader(fh).iter_messages():
+            try:
+                subject = keelson.get_subject_from_pubsub_key(channel.topic)
+            except ValueError:
+                subject = channel.topic
+            payloads[subject].append(message.data)
+    return payloads
+
+
+def measure(payloads: List[bytes], codec: int, repeat: int):
+    raw_size = sum(len(payload) for payload in payloads)
+
+    start = time.process_time()
+    for _ in range(repeat):
+        compressed = [compress(payload, codec) for payload in payloads]
+    compress_time = (time.process_time() - start) / repeat
+
+    start = time.process_time()
+    for _ in range(repeat):
+        for payload in compressed:
+            decompress(payload, codec)
+    decompress_time = (time.process_time() - start) / repeat
+
+    compressed_size = sum(len(payload) for payload in compressed)
+    megabytes = raw_size / 1e6
+    return (
+        raw_size / compressed_size,
+        compress_time / megabytes if megabytes else 0,
+        decompress_time / megabytes if megabytes else 0,
+    )
+
+
+def batches(payloads: List[bytes], batch_size: int) -> List[bytes]:
+    # Serialized EnvelopeBatch, i.e. what gets compressed for a batched envelope
+    return [
+        Envelope.FromString(
+            keelson.enclose_batch(
+                (0, payload) for payload in payloads[ix : ix + batch_size]
+            )
+        ).payload
+        for ix in range(0, len(payloads), batch_size)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="compression",
+        description="Benchmark envelope payload compression on an mcap recording",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("recording", type=Path, nargs="?", default=DEFAULT_RECORDING)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="Number of payloads per batch for the batched measurement",
+    )
+    args = parser.parse_args()
+
+    header = f"{'subject':<40} {'mode':<8} {'codec':<5} {'count':>6} {'size [kB]':>10} {'ratio':>6} {'comp [ms/MB]':>13} {'decomp [ms/MB]':>15}"
+    print(header)
+    print("-" * len(header))
+
+    for subject, payloads in sorted(load_payloads(args.recording).items()):
+        size = sum(len(payload) for payload in payloads) / 1e3
+        for mode, data in (
+            ("single", payloads),
+            ("batched", batches(payloads, args.batch_size)),
+        ):
+            for name, codec in CODECS.items():
+                ratio, compress_cost, decompress_cost = measure(
+                    data, codec, args.repeat
+                )
+                print(
+                    f"{subject:<40} {mode:<8} {name:<5} {len(payloads):>6} {size:>10.1f} {ratio:>6.2f} {compress_cost * 1e3:>13.1f} {decompress_cost * 1e3:>15.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
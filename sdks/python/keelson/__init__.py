@@ -1,5 +1,5 @@
 import time
-from typing import Tuple
+from typing import Iterable, List, Tuple
 from pathlib import Path
 import os
 from enum import Enum
@@ -12,8 +12,9 @@ from google.protobuf.descriptor_pb2 import FileDescriptorSet
 from google.protobuf.descriptor import Descriptor, FileDescriptor
 
 # from Envelope_pb2 import Envelope
-from .Envelope_pb2 import Envelope
+from .Envelope_pb2 import Envelope, EnvelopeBatch
 from . import payloads
+from .compression import COMPRESSION_NONE, compress, decompress
 
 _PACKAGE_ROOT = Path(__file__).parent
 
@@ -319,14 +320,37 @@ def get_subjects_from_rpc_key(key: str) -> str:
 
 
 # ENVELOPE HELPER FUNCTIONS
-def enclose(payload: bytes, enclosed_at: int = None) -> bytes:
+def _set_payload(env: Envelope, payload: bytes, compression: int):
+    if compression != COMPRESSION_NONE:
+        compressed = compress(payload, compression)
+
+        if len(compressed) < len(payload):
+            env.payload = compressed
+            env.compression = compression
+            return
+
+    # Uncompressed, or compression not worth it, send as is
+    env.payload = payload
+
+
+def _get_payload(env: Envelope) -> bytes:
+    if env.compression != COMPRESSION_NONE:
+        return decompress(env.payload, env.compression)
+    return env.payload
+
+
+def enclose(
+    payload: bytes, enclosed_at: int = None, compression: int = COMPRESSION_NONE
+) -> bytes:
     """
     Enclose a payload in an envelope.
 
     Args:
         payload (bytes): The payload to enclose.
         enclosed_at (int): The time at which the envelope was enclosed.
-        source_timestamp (int): The source timestamp of the payload.
+        compression (int): Envelope.Compression codec to compress the payload
+            with, the payload is sent uncompressed if compression does not
+            reduce its size.
 
     Returns:
         envelope (bytes):
@@ -334,37 +358,111 @@ def enclose(payload: bytes, enclosed_at: int = None) -> bytes:
     """
     env: Envelope = Envelope()
     env.enclosed_at.FromNanoseconds(enclosed_at or time.time_ns())
-    env.payload = payload
+    _set_payload(env, payload, compression)
     return env.SerializeToString()
 
 
 def uncover(message) -> object:
     """
-    Uncover Keelson message that is an envelope
+    Uncover Keelson message that is an envelope, decompressing the payload if
+    needed.
 
     Args:
         message (bytes): The envelope to uncover.
 
     Returns:
-        Object ( int, int, int, bytes):
-            enclosed_at, received_at,  payload
+        Tuple (int, int, bytes):
+            enclosed_at, received_at, payload
+
+    Raises:
+        ValueError: If the message is a batched envelope, use `uncover_all` to
+            uncover batched (as well as regular) envelopes into their individual
+            payloads.
 
     Example:
 
     ```
-    received_at, enclosed_at, payload = uncover(message)
+    enclosed_at, received_at, payload = uncover(message)
     ```
 
     """
     env = Envelope.FromString(message)
 
+    if env.batched:
+        raise ValueError(
+            "Message is a batch of envelopes, use uncover_all to uncover it!"
+        )
+
     enclose_at = env.enclosed_at.ToNanoseconds()
     received_at = time.time_ns()
-    payload = env.payload
+    payload = _get_payload(env)
 
     return enclose_at, received_at, payload
 
 
+def enclose_batch(
+    payloads: Iterable[Tuple[int, bytes]],
+    enclosed_at: int = None,
+    compression: int = COMPRESSION_NONE,
+) -> bytes:
+    """
+    Enclose many payloads, each with their own timestamp, in a single envelope.
+
+    Args:
+        payloads (Iterable[Tuple[int, bytes]]): (enclosed_at, payload) pairs.
+        enclosed_at (int): The time at which the batch was enclosed.
+        compression (int): Envelope.Compression codec to compress the batch with.
+
+    Returns:
+        envelope (bytes):
+            The enclosed batch of envelopes.
+    """
+    batch = EnvelopeBatch()
+    for payload_enclosed_at, payload in payloads:
+        env = batch.envelopes.add()
+        env.enclosed_at.FromNanoseconds(payload_enclosed_at)
+        env.payload = payload
+
+    env: Envelope = Envelope()
+    env.enclosed_at.FromNanoseconds(enclosed_at or time.time_ns())
+    _set_payload(env, batch.SerializeToString(), compression)
+    env.batched = True
+    return env.SerializeToString()
+
+
+def uncover_all(message) -> List[Tuple[int, int, bytes]]:
+    """
+    Uncover Keelson message that is either a single envelope or a batch of envelopes
+
+    Args:
+        message (bytes): The envelope to uncover.
+
+    Returns:
+        List [( int, int, bytes)]:
+            enclosed_at, received_at, payload for each of the enclosed payloads,
+            with their original enclosed_at timestamps.
+
+    Example:
+
+    ```
+    for enclosed_at, received_at, payload in uncover_all(message):
+        ...
+    ```
+
+    """
+    env = Envelope.FromString(message)
+    received_at = time.time_ns()
+    payload = _get_payload(env)
+
+    if not env.batched:
+        return [(env.enclosed_at.ToNanoseconds(), received_at, payload)]
+
+    return [
+        (inner.enclosed_at.ToNanoseconds(), received_at, inner.payload)
+        for inner in EnvelopeBatch.FromString(payload).envelopes
+    ]
+
+
 # PROTOBUF PAYLOADS HELPER FUNCTIONS
 with (_PACKAGE_ROOT / "payloads" / "protobuf_file_descriptor_set.bin").open("rb") as fh:
     _PROTOBUF_FILE_DESCRIPTOR_SET = FileDescriptorSet.FromString(fh.read())
@@ -412,3 +510,24 @@ def is_subject_well_known(subject: str) -> bool:
 
 def get_subject_schema(subject: str) -> str:
     return _SUBJECTS[subject]["schema"]
+
+
+# PROCEDURES HELPER FUNCTIONS
+with (_PACKAGE_ROOT / "procedures.yaml").open() as fh:
+    _PROCEDURES = yaml.safe_load(fh)
+
+
+def is_procedure_well_known(procedure: str) -> bool:
+    return procedure in _PROCEDURES
+
+
+def get_procedure_schemas(procedure: str) -> Tuple[str, str]:
+    """
+    Get the input and output schemas of a well-known procedure.
+
+    Returns:
+        Tuple (str, str):
+            schema_input, schema_output (either may be None if not applicable)
+    """
+    definition = _PROCEDURES[procedure]
+    return definition.get("schema_input"), definition.get("schema_output")
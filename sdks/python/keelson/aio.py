@@ -0,0 +1,323 @@
+"""
+asyncio-native publishers and subscribers for keelson.
+
+Subscribers buffer uncovered (and, for well-known subjects, decoded) messages
+received on the zenoh callback thread and hand them over to an asyncio event
+loop without polling. The event loop is woken up at most once per burst of
+messages, which allows a single loop to consume several thousand messages per
+second, preferably in batches using `Subscriber.next_batch`.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+import zenoh
+from google.protobuf.message import Message
+
+from . import (
+    enclose,
+    get_subject_from_pubsub_key,
+    uncover_all,
+    parse_pubsub_key,
+    is_subject_well_known,
+    get_subject_schema,
+    get_protobuf_message_class_from_type_name,
+)
+from .compression import COMPRESSION_NONE, CompressionPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class Sample(NamedTuple):
+    key: str
+    subject: str
+    source_id: str
+    enclosed_at: int
+    received_at: int
+    payload: Union[Message, bytes]
+
+
+class Subscriber:
+    """
+    Asynchronous iterator of uncovered and decoded samples received on a key.
+
+    Payloads of well-known subjects are decoded to their protobuf message,
+    other payloads are passed on as bytes. Batched envelopes are unbatched into
+    individual samples with their original enclosed_at timestamps. Samples on
+    keys not adhering to the keelson pubsub key format, or not containing a
+    valid envelope, are dropped.
+
+    Args:
+        session (zenoh.Session): The zenoh session to subscribe on.
+        key (str): The key expression to subscribe to.
+        max_queue_size (int): Maximum number of buffered samples, the oldest
+            samples are dropped (and counted in `dropped`) when exceeded.
+        loop (asyncio.AbstractEventLoop): The event loop consuming the samples.
+            Defaults to the running event loop.
+
+    Example:
+
+    ```
+    async with Subscriber(session, "realm/v0/entity/pubsub/rpm/**") as sub:
+        async for sample in sub:
+            print(sample.payload.value)
+    ```
+    """
+
+    def __init__(
+        self,
+        session: zenoh.Session,
+        key: str,
+        *,
+        max_queue_size: int = 10000,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        self.key = key
+        self.dropped = 0
+
+        self._loop = loop or asyncio.get_running_loop()
+        self._buffer: Deque[Sample] = deque(maxlen=max_queue_size)
+        self._ready = asyncio.Event()
+        self._notified = False
+        self._closed = False
+        self._keys: Dict[str, Optional[Tuple[str, str, Optional[type]]]] = {}
+
+        logger.debug("Declaring subscriber on key: %s", key)
+        self._subscriber = session.declare_subscriber(key, self._on_sample)
+
+    def _resolve_key(self, key: str) -> Optional[Tuple[str, str, Optional[type]]]:
+        if key not in self._keys:
+            try:
+                parsed = parse_pubsub_key(key)
+            except ValueError:
+                logger.warning("Ignoring key with unexpected format: %s", key)
+                self._keys[key] = None
+                return None
+
+            subject = parsed["subject"]
+            message_class = (
+                get_protobuf_message_class_from_type_name(get_subject_schema(subject))
+                if is_subject_well_known(subject)
+                else None
+            )
+            self._keys[key] = (subject, parsed["source_id"], message_class)
+
+        return self._keys[key]
+
+    def _on_sample(self, sample: zenoh.Sample):
+        # Runs on the zenoh callback thread
+        key = str(sample.key_expr)
+
+        if (resolved := self._resolve_key(key)) is None:
+            return
+        subject, source_id, message_class = resolved
+
+        try:
+            uncovered = uncover_all(sample.payload.to_bytes())
+            if message_class is not None:
+                uncovered = [
+                    (enclosed_at, received_at, message_class.FromString(payload))
+                    for enclosed_at, received_at, payload in uncovered
+                ]
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Failed to uncover/decode sample on key: %s", key)
+            return
+
+        for enclosed_at, received_at, payload in uncovered:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+
+            self._buffer.append(
+                Sample(key, subject, source_id, enclosed_at, received_at, payload)
+            )
+
+        # Only wake up the event loop once per burst of samples
+        if not self._notified:
+            self._notified = True
+            try:
+                self._loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                # Event loop is closed
+                pass
+
+    async def _wait(self):
+        while not self._buffer:
+            if self._closed:
+                raise StopAsyncIteration
+
+            self._ready.clear()
+            self._notified = False
+
+            # Samples may have arrived before the flag was reset
+            if self._buffer:
+                break
+
+            await self._ready.wait()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Sample:
+        await self._wait()
+        return self._buffer.popleft()
+
+    async def next_batch(self, max_size: int = 1000) -> List[Sample]:
+        """
+        Wait for at least one sample and return all buffered samples, up to max_size.
+
+        Raises:
+            StopAsyncIteration: If the subscriber is closed and drained.
+        """
+        await self._wait()
+        buffer = self._buffer
+        return [buffer.popleft() for _ in range(min(max_size, len(buffer)))]
+
+    async def batches(self, max_size: int = 1000):
+        """Asynchronous iterator of batches as returned by `next_batch`."""
+        while True:
+            try:
+                yield await self.next_batch(max_size)
+            except StopAsyncIteration:
+                return
+
+    def close(self):
+        """
+        Undeclare the subscriber. Already buffered samples can still be consumed,
+        after which iteration stops.
+        """
+        if self._closed:
+            return
+
+        logger.debug("Undeclaring subscriber on key: %s", self.key)
+        self._subscriber.undeclare()
+        self._closed = True
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Event loop is closed, nobody is waiting
+            pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class Publisher:
+    """
+    Asynchronous publisher serializing and enclosing payloads on demand.
+
+    Args:
+        session (zenoh.Session): The zenoh session to publish on.
+        key (str): The key to publish to.
+        compression_policy (CompressionPolicy): Policy deciding whether to
+            compress each payload, based on its size and the subject of the key.
+        **kwargs: Passed on to `zenoh.Session.declare_publisher`.
+    """
+
+    def __init__(
+        self,
+        session: zenoh.Session,
+        key: str,
+        *,
+        compression_policy: Optional[CompressionPolicy] = None,
+        **kwargs,
+    ):
+        self.key = key
+        self._closed = False
+        self._compression_policy = compression_policy
+        self._subject = (
+            get_subject_from_pubsub_key(key) if compression_policy is not None else None
+        )
+
+        logger.debug("Declaring publisher on key: %s", key)
+        self._publisher = session.declare_publisher(key, **kwargs)
+
+    async def put(
+        self, payload: Union[Message, bytes], enclosed_at: Optional[int] = None
+    ):
+        """
+        Serialize (if a protobuf message), enclose and publish a payload.
+
+        Args:
+            payload (Message | bytes): The payload to publish.
+            enclosed_at (int): The time at which the envelope was enclosed.
+        """
+        if self._closed:
+            raise RuntimeError(f"Publisher on key {self.key} is closed!")
+
+        if isinstance(payload, Message):
+            payload = payload.SerializeToString()
+
+        compression = (
+            self._compression_policy.select(self._subject, payload)
+            if self._compression_policy is not None
+            else COMPRESSION_NONE
+        )
+
+        self._publisher.put(enclose(payload, enclosed_at, compression))
+
+    def close(self):
+        """Undeclare the publisher."""
+        if self._closed:
+            return
+
+        logger.debug("Undeclaring publisher on key: %s", self.key)
+        self._publisher.undeclare()
+        self._closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class Session:
+    """
+    Thin asyncio wrapper around a zenoh session keeping track of the
+    subscribers and publishers declared through it, such that they all can be
+    closed down in one go. The wrapped zenoh session is not closed.
+
+    Example:
+
+    ```
+    async with keelson.aio.Session(zenoh_session) as session:
+        publisher = session.declare_publisher(key)
+        subscriber = session.declare_subscriber(key)
+    ```
+    """
+
+    def __init__(self, session: zenoh.Session):
+        self.session = session
+        self._declared: Set[Union[Subscriber, Publisher]] = set()
+
+    def declare_subscriber(self, key: str, **kwargs) -> Subscriber:
+        subscriber = Subscriber(self.session, key, **kwargs)
+        self._declared.add(subscriber)
+        return subscriber
+
+    def declare_publisher(self, key: str, **kwargs) -> Publisher:
+        publisher = Publisher(self.session, key, **kwargs)
+        self._declared.add(publisher)
+        return publisher
+
+    def close(self):
+        """Close all subscribers and publishers declared through this session."""
+        while self._declared:
+            declared = self._declared.pop()
+            try:
+                declared.close()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception(
+                    "Failed to close %s on key: %s", declared, declared.key
+                )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
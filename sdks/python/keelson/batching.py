@@ -0,0 +1,124 @@
+"""
+Batching of high-rate small payloads into a single envelope.
+"""
+
+import time
+import logging
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from . import enclose_batch
+from .compression import COMPRESSION_NONE
+
+logger = logging.getLogger(__name__)
+
+# Approximate protobuf overhead per enclosed payload (timestamp and framing)
+_ENVELOPE_OVERHEAD = 16
+
+
+class Batcher:
+    """
+    Collect payloads and publish them as one batched envelope.
+
+    A batch is flushed when it reaches `max_count` payloads, `max_bytes`
+    (approximate) bytes or when the oldest payload in it has waited for
+    `max_latency` seconds, whichever comes first. Each payload keeps its own
+    enclosed_at timestamp, which `keelson.uncover_all` restores on the
+    receiving end.
+
+    Args:
+        publish (Callable[[bytes], None]): Called with each enclosed batch,
+            typically the `put` method of a zenoh publisher.
+        max_count (int): Maximum number of payloads in a batch.
+        max_bytes (int): Maximum approximate size in bytes of a batch.
+        max_latency (float): Maximum time in seconds a payload may be held back.
+        compression (int): Envelope.Compression codec to compress batches with.
+
+    Example:
+
+    ```
+    publisher = session.declare_publisher(key)
+    with Batcher(publisher.put, max_latency=0.1) as batcher:
+        batcher.add(payload.SerializeToString())
+    ```
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[bytes], None],
+        *,
+        max_count: int = 100,
+        max_bytes: int = 8192,
+        max_latency: float = 0.1,
+        compression: int = COMPRESSION_NONE,
+    ):
+        self._publish = publish
+        self._max_count = max_count
+        self._max_bytes = max_bytes
+        self._max_latency = max_latency
+        self._compression = compression
+
+        self._lock = threading.Lock()
+        self._payloads: List[Tuple[int, bytes]] = []
+        self._size = 0
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+
+    def add(self, payload: bytes, enclosed_at: Optional[int] = None):
+        """
+        Add a payload to the current batch, flushing it if full.
+
+        Args:
+            payload (bytes): The payload to enclose.
+            enclosed_at (int): The time at which the payload was enclosed.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Batcher is closed!")
+
+            self._payloads.append((enclosed_at or time.time_ns(), payload))
+            self._size += len(payload) + _ENVELOPE_OVERHEAD
+
+            if len(self._payloads) >= self._max_count or self._size >= self._max_bytes:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self._max_latency, self._on_timeout)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Publish the current batch, if not empty."""
+        with self._lock:
+            self._flush()
+
+    def _on_timeout(self):
+        with self._lock:
+            # Only flush if this timer belongs to the current batch
+            if self._timer is threading.current_thread():
+                self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._payloads:
+            return
+
+        logger.debug("Flushing batch of %d payloads", len(self._payloads))
+        message = enclose_batch(self._payloads, compression=self._compression)
+        self._payloads = []
+        self._size = 0
+        self._publish(message)
+
+    def close(self):
+        """Flush any remaining payloads and stop accepting new ones."""
+        with self._lock:
+            self._flush()
+            self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
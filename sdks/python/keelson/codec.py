@@ -7,7 +7,7 @@ from google.protobuf.json_format import ParseDict, MessageToDict
 
 from . import (
     enclose,
-    uncover,
+    uncover_all,
     is_subject_well_known,
     get_subject_from_pubsub_key,
     get_subject_schema,
@@ -20,6 +20,11 @@ from .payloads.Primitives_pb2 import TimestampedBytes
 logger = logging.getLogger(__file__)
 
 
+def _uncover_payloads(value: bytes):
+    # A batched envelope holds several messages, these are output one per line
+    return [payload for _, _, payload in uncover_all(value)]
+
+
 def enclose_from_text(key: str, value: str) -> bytes:
     subject = get_subject_from_pubsub_key(key)
 
@@ -71,9 +76,10 @@ def uncover_to_text(key: str, value: bytes) -> str:
             f"keelson-uncover-to-text can only be used together with a 'raw' subject! You tried to use it with '{subject}'"
         )
 
-    received_at, enclosed_at, payload = uncover(value)
-    parsed = TimestampedBytes.FromString(payload)
-    return parsed.value.decode()
+    return "\n".join(
+        TimestampedBytes.FromString(payload).value.decode()
+        for payload in _uncover_payloads(value)
+    )
 
 
 def uncover_to_base64(key: str, value: bytes) -> str:
@@ -84,9 +90,10 @@ def uncover_to_base64(key: str, value: bytes) -> str:
             f"keelson-uncover-to-base64 can only be used together with a 'raw' subject! You tried to use it with '{subject}'"
         )
 
-    received_at, enclosed_at, payload = uncover(value)
-    parsed = TimestampedBytes.FromString(payload)
-    return b64encode(parsed.value).decode()
+    return "\n".join(
+        b64encode(TimestampedBytes.FromString(payload).value).decode()
+        for payload in _uncover_payloads(value)
+    )
 
 
 def uncover_to_json(key: str, value: bytes) -> str:
@@ -96,13 +103,14 @@ def uncover_to_json(key: str, value: bytes) -> str:
         raise RuntimeError(f"Tag ({subject}) is not well-known!")
 
     type_name = get_subject_schema(subject)
-    received_at, enclosed_at, payload = uncover(value)
-    message = decode_protobuf_payload_from_type_name(payload, type_name)
-    return json.dumps(
-        MessageToDict(
-            message,
-            always_print_fields_with_no_presence=True,
-            preserving_proto_field_name=True,
-            use_integers_for_enums=True,
+    return "\n".join(
+        json.dumps(
+            MessageToDict(
+                decode_protobuf_payload_from_type_name(payload, type_name),
+                always_print_fields_with_no_presence=True,
+                preserving_proto_field_name=True,
+                use_integers_for_enums=True,
+            )
         )
+        for payload in _uncover_payloads(value)
     )
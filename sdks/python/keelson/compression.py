@@ -0,0 +1,130 @@
+"""
+Optional compression of envelope payloads.
+
+Compression codecs depend on optional packages, install them with:
+
+`pip install keelson[compression]`
+"""
+
+import threading
+from typing import Iterable, Optional
+
+from .Envelope_pb2 import Envelope
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.block
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+COMPRESSION_NONE = Envelope.COMPRESSION_NONE
+COMPRESSION_ZSTD = Envelope.COMPRESSION_ZSTD
+COMPRESSION_LZ4 = Envelope.COMPRESSION_LZ4
+
+# Well-known subjects with large payloads that are worth compressing
+DEFAULT_COMPRESSED_SUBJECTS = frozenset(
+    [
+        "image_raw",
+        "laser_scan",
+        "point_cloud",
+        "point_cloud_simplified",
+        "radar_spoke",
+        "radar_sweep",
+    ]
+)
+
+# zstd contexts hold sizable internal buffers and are not thread-safe, so we
+# keep one (reused) compressor and decompressor per thread.
+_ZSTD_CONTEXTS = threading.local()
+
+
+def _require(codec: int):
+    if codec == COMPRESSION_ZSTD and zstandard is None:
+        raise ImportError(
+            "zstd compression requires the 'zstandard' package, install with: pip install keelson[compression]"
+        )
+    if codec == COMPRESSION_LZ4 and lz4 is None:
+        raise ImportError(
+            "lz4 compression requires the 'lz4' package, install with: pip install keelson[compression]"
+        )
+    if codec not in (COMPRESSION_NONE, COMPRESSION_ZSTD, COMPRESSION_LZ4):
+        raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def _zstd_compressor() -> "zstandard.ZstdCompressor":
+    if (compressor := getattr(_ZSTD_CONTEXTS, "compressor", None)) is None:
+        compressor = _ZSTD_CONTEXTS.compressor = zstandard.ZstdCompressor(level=3)
+    return compressor
+
+
+def _zstd_decompressor() -> "zstandard.ZstdDecompressor":
+    if (decompressor := getattr(_ZSTD_CONTEXTS, "decompressor", None)) is None:
+        decompressor = _ZSTD_CONTEXTS.decompressor = zstandard.ZstdDecompressor()
+    return decompressor
+
+
+def compress(data: bytes, codec: int) -> bytes:
+    """
+    Compress data using one of the Envelope.Compression codecs.
+    """
+    _require(codec)
+
+    if codec == COMPRESSION_ZSTD:
+        return _zstd_compressor().compress(data)
+    if codec == COMPRESSION_LZ4:
+        return lz4.block.compress(data, store_size=True)
+    return data
+
+
+def decompress(data: bytes, codec: int) -> bytes:
+    """
+    Decompress data compressed using one of the Envelope.Compression codecs.
+    """
+    _require(codec)
+
+    if codec == COMPRESSION_ZSTD:
+        return _zstd_decompressor().decompress(data)
+    if codec == COMPRESSION_LZ4:
+        return lz4.block.decompress(data)
+    return data
+
+
+class CompressionPolicy:
+    """
+    Decide which compression codec, if any, to use for a payload.
+
+    Args:
+        codec (int): The codec to use for payloads that should be compressed.
+        threshold (int): Minimum payload size in bytes to compress.
+        subjects (Iterable[str]): Subjects to compress payloads of, or None for
+            all subjects.
+
+    Example:
+
+    ```
+    policy = CompressionPolicy(COMPRESSION_ZSTD, threshold=4096)
+    envelope = enclose(payload, compression=policy.select(subject, payload))
+    ```
+    """
+
+    def __init__(
+        self,
+        codec: int = COMPRESSION_ZSTD,
+        threshold: int = 1024,
+        subjects: Optional[Iterable[str]] = DEFAULT_COMPRESSED_SUBJECTS,
+    ):
+        _require(codec)
+        self.codec = codec
+        self.threshold = threshold
+        self.subjects = frozenset(subjects) if subjects is not None else None
+
+    def select(self, subject: str, payload: bytes) -> int:
+        if len(payload) < self.threshold:
+            return COMPRESSION_NONE
+        if self.subjects is not None and subject not in self.subjects:
+            return COMPRESSION_NONE
+        return self.codec
@@ -0,0 +1,439 @@
+"""
+Typed request/reply (RPC) helpers on top of zenoh queryables.
+
+Procedures are looked up in the well-known procedure registry (procedures.yaml)
+and requests and responses are encoded/decoded accordingly, enclosed in keelson
+envelopes. Handlers are never run on the zenoh callback thread, instead they are
+dispatched to an asyncio event loop (coroutine handlers) or to an executor via
+that event loop (regular callables).
+"""
+
+import asyncio
+import inspect
+import logging
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple, Union
+
+import zenoh
+from google.protobuf.message import Message
+
+from . import (
+    enclose,
+    uncover,
+    construct_rpc_key,
+    is_subject_well_known,
+    get_subject_schema,
+    is_procedure_well_known,
+    get_procedure_schemas,
+    get_protobuf_message_class_from_type_name,
+)
+
+logger = logging.getLogger(__name__)
+
+NOT_APPLICABLE = "none"
+
+
+class RPCError(Exception):
+    """Raised by a Requester when the responder replied with an error."""
+
+
+def _resolve_message_classes(
+    procedure: str, subject_in: str, subject_out: str
+) -> Tuple[Optional[type], Optional[type]]:
+    """
+    Resolve the protobuf message classes used for input and output of a procedure.
+
+    Well-known procedures take precedence, otherwise the schemas of the
+    well-known subjects (if any) are used. Absent schemas result in None,
+    meaning that the payload is passed through as raw bytes.
+
+    Raises:
+        ValueError: If a schema does not refer to a known protobuf message type.
+    """
+    if is_procedure_well_known(procedure):
+        schema_in, schema_out = get_procedure_schemas(procedure)
+    else:
+        schema_in = (
+            get_subject_schema(subject_in)
+            if is_subject_well_known(subject_in)
+            else None
+        )
+        schema_out = (
+            get_subject_schema(subject_out)
+            if is_subject_well_known(subject_out)
+            else None
+        )
+
+    return (
+        _resolve_message_class(procedure, schema_in),
+        _resolve_message_class(procedure, schema_out),
+    )
+
+
+def _resolve_message_class(procedure: str, schema: Optional[str]) -> Optional[type]:
+    if not schema:
+        return None
+    try:
+        return get_protobuf_message_class_from_type_name(schema)
+    except KeyError as exc:
+        raise ValueError(
+            f"Schema {schema} of procedure {procedure} is not a known protobuf message type"
+        ) from exc
+
+
+def _encode(message: Union[Message, bytes, None]) -> bytes:
+    if message is None:
+        return enclose(b"")
+    if isinstance(message, Message):
+        return enclose(message.SerializeToString())
+    return enclose(bytes(message))
+
+
+def _decode(data: bytes, message_class: Optional[type]) -> Union[Message, bytes]:
+    _, _, payload = uncover(data)
+    if message_class is None:
+        return payload
+    return message_class.FromString(payload)
+
+
+class _Procedure(NamedTuple):
+    name: str
+    handler: Callable
+    request_class: Optional[type]
+    response_class: Optional[type]
+    timeout: float
+
+
+class Responder:
+    """
+    Serve one or more procedures for a single source_id.
+
+    Args:
+        session (zenoh.Session): The zenoh session to declare queryables on.
+        realm (str): The realm of the entity.
+        entity_id (str): The entity id.
+        source_id (str): The source id of this responder.
+        loop (asyncio.AbstractEventLoop): Event loop to run handlers on. If not
+            given, a private event loop is started in a background thread.
+        executor (concurrent.futures.Executor): Executor for non-coroutine
+            handlers. Defaults to a private thread pool of max_pending threads.
+        max_pending (int): Maximum number of requests being handled at the same
+            time, further requests are immediately replied with an error. Note
+            that non-coroutine handlers cannot be cancelled, a request timing
+            out in such a handler keeps occupying its slot (and thread) until
+            the handler returns.
+        timeout (float): Default per-request timeout in seconds.
+
+    Example:
+
+    ```
+    with Responder(session, "realm", "entity", "camera/0") as responder:
+        responder.register("camera_config_apply", handler)
+    ```
+    """
+
+    def __init__(
+        self,
+        session: zenoh.Session,
+        realm: str,
+        entity_id: str,
+        source_id: str,
+        *,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        executor: Optional[Executor] = None,
+        max_pending: int = 64,
+        timeout: float = 5.0,
+    ):
+        self._session = session
+        self._realm = realm
+        self._entity_id = entity_id
+        self._source_id = source_id
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_pending, thread_name_prefix="keelson-rpc-handler"
+        )
+        self._timeout = timeout
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._queryables: Dict[str, zenoh.Queryable] = {}
+
+        self._thread = None
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=loop.run_forever, name="keelson-rpc", daemon=True
+            )
+            self._thread.start()
+        self._loop = loop
+
+    def register(
+        self,
+        procedure: str,
+        handler: Callable,
+        *,
+        subject_in: str = NOT_APPLICABLE,
+        subject_out: str = NOT_APPLICABLE,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """
+        Register a handler for a procedure.
+
+        The handler is called with the decoded request (a protobuf message, raw
+        bytes if the input schema is unknown or None if the request carried no
+        payload) and should return a protobuf message, bytes or None. Handlers
+        may be regular callables or coroutine functions.
+
+        Returns:
+            key_expression (str):
+                The key of the declared queryable.
+        """
+        request_class, response_class = _resolve_message_classes(
+            procedure, subject_in, subject_out
+        )
+        endpoint = _Procedure(
+            procedure,
+            handler,
+            request_class,
+            response_class,
+            self._timeout if timeout is None else timeout,
+        )
+
+        key = construct_rpc_key(
+            realm=self._realm,
+            entity_id=self._entity_id,
+            procedure=procedure,
+            subject_in=subject_in,
+            subject_out=subject_out,
+            source_id=self._source_id,
+        )
+
+        logger.info("Declaring queryable for procedure %s on key: %s", procedure, key)
+        self._queryables[key] = self._session.declare_queryable(
+            key, lambda query: self._on_query(endpoint, query), complete=True
+        )
+        return key
+
+    def _on_query(self, endpoint: _Procedure, query: zenoh.Query):
+        # Runs on the zenoh callback thread, do as little as possible here!
+        if not self._pending.acquire(blocking=False):
+            logger.warning("Too many pending requests, rejecting %s", query.key_expr)
+            query.reply_err(
+                f"Too many pending requests for procedure {endpoint.name}, try again later"
+            )
+            query.drop()
+            return
+
+        try:
+            asyncio.run_coroutine_threadsafe(self._serve(endpoint, query), self._loop)
+        except RuntimeError:
+            self._pending.release()
+            query.reply_err("Responder is closing down")
+            query.drop()
+
+    async def _serve(self, endpoint: _Procedure, query: zenoh.Query):
+        release = self._pending.release
+        try:
+            request = (
+                _decode(query.payload.to_bytes(), endpoint.request_class)
+                if query.payload is not None
+                else None
+            )
+
+            if inspect.iscoroutinefunction(endpoint.handler):
+                response = await asyncio.wait_for(
+                    endpoint.handler(request), endpoint.timeout
+                )
+            else:
+                # A running handler cannot be cancelled, so the pending slot is
+                # released when the handler actually returns, not on timeout
+                work = self._executor.submit(endpoint.handler, request)
+                work.add_done_callback(lambda _: self._pending.release())
+                release = None
+                try:
+                    response = await asyncio.wait_for(
+                        asyncio.shield(asyncio.wrap_future(work)), endpoint.timeout
+                    )
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    # Only succeeds if the handler has not started yet
+                    work.cancel()
+                    raise
+
+            query.reply(query.key_expr, _encode(response))
+
+        except asyncio.TimeoutError:
+            logger.error(
+                "Procedure %s timed out after %s s", endpoint.name, endpoint.timeout
+            )
+            query.reply_err(
+                f"Procedure {endpoint.name} timed out after {endpoint.timeout} s"
+            )
+        except asyncio.CancelledError:
+            query.reply_err("Responder is closing down")
+            raise
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            logger.exception("Procedure %s failed", endpoint.name)
+            query.reply_err(f"Procedure {endpoint.name} failed: {exc}")
+        finally:
+            query.drop()
+            if release is not None:
+                release()
+
+    def close(self):
+        """
+        Undeclare all queryables and stop the private event loop and executor
+        (if any). Handlers still running in the private executor are not waited for.
+        """
+        for key, queryable in self._queryables.items():
+            logger.debug("Undeclaring queryable on key: %s", key)
+            queryable.undeclare()
+        self._queryables.clear()
+
+        if self._own_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+        if self._thread is None:
+            return
+
+        async def _shutdown():
+            tasks = [
+                task
+                for task in asyncio.all_tasks()
+                if task is not asyncio.current_task()
+            ]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._loop.shutdown_default_executor()
+
+        asyncio.run_coroutine_threadsafe(_shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Requester:
+    """
+    Call procedures served by one or more Responders.
+
+    Args:
+        session (zenoh.Session): The zenoh session to issue queries on.
+        realm (str): The realm of the entity.
+        entity_id (str): The entity id.
+        timeout (float): Default timeout in seconds when waiting for replies.
+    """
+
+    def __init__(
+        self,
+        session: zenoh.Session,
+        realm: str,
+        entity_id: str,
+        *,
+        timeout: float = 5.0,
+    ):
+        self._session = session
+        self._realm = realm
+        self._entity_id = entity_id
+        self._timeout = timeout
+
+    def call(
+        self,
+        procedure: str,
+        source_id: str,
+        request: Union[Message, bytes, None] = None,
+        *,
+        subject_in: str = NOT_APPLICABLE,
+        subject_out: str = NOT_APPLICABLE,
+        timeout: Optional[float] = None,
+    ) -> Union[Message, bytes]:
+        """
+        Call a procedure on a single source_id.
+
+        Returns:
+            response (Message | bytes):
+                The decoded response.
+
+        Raises:
+            RPCError: If the responder replied with an error.
+            TimeoutError: If no reply was received in time.
+        """
+        result = self.call_many(
+            procedure,
+            [source_id],
+            request,
+            subject_in=subject_in,
+            subject_out=subject_out,
+            timeout=timeout,
+        )[source_id]
+
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def call_many(
+        self,
+        procedure: str,
+        source_ids: Iterable[str],
+        request: Union[Message, bytes, None] = None,
+        *,
+        subject_in: str = NOT_APPLICABLE,
+        subject_out: str = NOT_APPLICABLE,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Union[Message, bytes, Exception]]:
+        """
+        Call a procedure on several source_ids concurrently.
+
+        All queries are issued before any reply is awaited, so the total time is
+        bounded by the slowest responder rather than the sum of all of them.
+
+        Returns:
+            Dict (dict):
+                source_id -> decoded response, or the exception (RPCError or
+                TimeoutError) for source_ids that failed.
+        """
+        _, response_class = _resolve_message_classes(procedure, subject_in, subject_out)
+        timeout = self._timeout if timeout is None else timeout
+        payload = _encode(request) if request is not None else None
+
+        in_flight = {}
+        for source_id in source_ids:
+            key = construct_rpc_key(
+                realm=self._realm,
+                entity_id=self._entity_id,
+                procedure=procedure,
+                subject_in=subject_in,
+                subject_out=subject_out,
+                source_id=source_id,
+            )
+            logger.debug("Querying key: %s", key)
+            in_flight[source_id] = (
+                key,
+                self._session.get(key, payload=payload, timeout=timeout),
+            )
+
+        results = {}
+        for source_id, (key, replies) in in_flight.items():
+            results[source_id] = TimeoutError(f"No reply from {key} within {timeout} s")
+            for reply in replies:
+                if reply.ok is not None:
+                    try:
+                        results[source_id] = _decode(
+                            reply.ok.payload.to_bytes(), response_class
+                        )
+                    except Exception as exc:  # pylint: disable=broad-exception-caught
+                        results[source_id] = RPCError(
+                            f"Failed to decode reply from {key}: {exc}"
+                        )
+                else:
+                    results[source_id] = RPCError(
+                        reply.err.payload.to_bytes().decode(errors="replace")
+                    )
+                break
+
+        return results
@@ -0,0 +1,414 @@
+"""
+Latest-value cache of targets (keelson targets, AIS vessels and location
+fixes) with a grid-based spatial index for bounding box and radius queries.
+"""
+
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .payloads.Target_pb2 import Target, Targets
+from .payloads.AIS_pb2 import AISVessel, AISVesselMessage
+from .payloads.LocationFix_pb2 import LocationFix
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_NM = 3440.065
+
+# Prefix of the ids of unidentified targets, see identify_target
+TRACK_PREFIX = "track/"
+
+# (target_id, latitude, longitude, payload)
+Position = Tuple[str, Optional[float], Optional[float], bytes]
+
+
+def _valid(latitude: float, longitude: float) -> bool:
+    # AIS uses 91/181 for "not available", 0/0 is the protobuf default
+    return (
+        -90 <= latitude <= 90
+        and -180 <= longitude <= 180
+        and not (latitude == 0 and longitude == 0)
+    )
+
+
+def _position(target_id: str, latitude: float, longitude: float, payload: bytes):
+    if not _valid(latitude, longitude):
+        return (target_id, None, None, payload)
+    return (target_id, latitude, longitude, payload)
+
+
+def identify_target(target: Target, index: int = 0) -> str:
+    """
+    Stable identity of a target within the key it is published on.
+
+    Identified targets (MMSI, IMO or call sign) are identified as such,
+    unidentified targets (typically radar, lidar or camera tracks) by their
+    index within the message they were published in.
+    """
+    information = target.identification.vessel.information
+    if information.mmsi:
+        return f"mmsi/{information.mmsi}"
+    if information.imo:
+        return f"imo/{information.imo}"
+    if information.call_sign:
+        return f"call_sign/{information.call_sign}"
+    return f"{TRACK_PREFIX}{index}"
+
+
+def _target_position(target: Target, index: int, payload: bytes) -> Position:
+    identity = identify_target(target, index)
+
+    if target.HasField("location"):
+        return _position(
+            identity, target.location.latitude, target.location.longitude, payload
+        )
+    if target.HasField("position"):
+        return _position(
+            identity,
+            target.position.latitude_degree,
+            target.position.longitude_degree,
+            payload,
+        )
+    return (identity, None, None, payload)
+
+
+def _ais_position(vessel, payload: bytes) -> Position:
+    return _position(
+        f"mmsi/{vessel.mmsi}", vessel.latitude_degree, vessel.longitude_degree, payload
+    )
+
+
+def positions_from_target(payload: bytes) -> List[Position]:
+    return [_target_position(Target.FromString(payload), 0, payload)]
+
+
+def positions_from_targets(payload: bytes) -> List[Position]:
+    # Explode into one Targets message per target
+    message = Targets.FromString(payload)
+    positions = []
+    for index, target in enumerate(message.targets):
+        single = Targets()
+        single.timestamp_source.CopyFrom(message.timestamp_source)
+        single.targets.append(target)
+        positions.append(_target_position(target, index, single.SerializeToString()))
+    return positions
+
+
+def positions_from_ais_vessel(payload: bytes) -> List[Position]:
+    return [_ais_position(AISVessel.FromString(payload), payload)]
+
+
+def positions_from_ais_vessel_message(payload: bytes) -> List[Position]:
+    return [_ais_position(AISVesselMessage.FromString(payload).ais_vessel, payload)]
+
+
+def positions_from_location_fix(payload: bytes) -> List[Position]:
+    fix = LocationFix.FromString(payload)
+    return [_position("", fix.latitude, fix.longitude, payload)]
+
+
+EXTRACTORS = {
+    "target": positions_from_target,
+    "targets": positions_from_targets,
+    "ais_vessel": positions_from_ais_vessel,
+    "ais_vessel_message": positions_from_ais_vessel_message,
+    "location_fix": positions_from_location_fix,
+}
+
+
+def haversine_nm(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_NM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class CachedTarget(NamedTuple):
+    """Copy of the latest state of a single target, as returned by queries."""
+
+    key: str
+    target_id: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+    enclosed_at: int
+    payload: bytes
+
+
+class _Entry:
+    """Latest state of a single target, only to be accessed under the lock."""
+
+    __slots__ = (
+        "key",
+        "target_id",
+        "latitude",
+        "longitude",
+        "cell",
+        "enclosed_at",
+        "payload",
+        "updated_at",
+    )
+
+    def __init__(self, key: str, target_id: str):
+        self.key = key
+        self.target_id = target_id
+        self.latitude = None
+        self.longitude = None
+        self.cell = None
+        self.enclosed_at = 0
+        self.payload = b""
+        self.updated_at = 0.0
+
+    def copy(self) -> CachedTarget:
+        return CachedTarget(
+            self.key,
+            self.target_id,
+            self.latitude,
+            self.longitude,
+            self.enclosed_at,
+            self.payload,
+        )
+
+
+EntryId = Tuple[str, str]
+
+# (lat_min, lon_min, lat_max, lon_max), with lon_min > lon_max crossing the antimeridian
+BoundingBox = Tuple[float, float, float, float]
+
+
+class TargetCache:
+    """
+    Latest-value cache of targets with a grid-based spatial index.
+
+    Entries are identified by the key they were received on together with the
+    target id, and are indexed in a grid of cell_size by cell_size degrees, so
+    that spatial queries only visit the entries in the cells overlapping the
+    query area. Entries are kept in update order, so that expired entries can
+    be evicted from the front without scanning the whole cache. Queries return
+    copies (CachedTarget) of the entries, taken under the lock, so they are
+    consistent even while the cache is being updated.
+
+    Args:
+        ttl (float): Time (s) after which entries that have not been updated
+            expire.
+        cell_size (float): Size (degrees) of the cells of the spatial index.
+
+    Example:
+
+    ```
+    cache = TargetCache()
+    for target_id, latitude, longitude, data in EXTRACTORS[subject](payload):
+        cache.update(key, target_id, latitude, longitude, enclosed_at, data)
+    nearby = cache.within_radius(57.7, 11.9, radius_nm=5)
+    ```
+    """
+
+    def __init__(self, ttl: float = 600.0, cell_size: float = 0.1):
+        self._ttl = ttl
+        self._cell_size = cell_size
+        self._entries: "OrderedDict[EntryId, _Entry]" = OrderedDict()
+        self._cells: Dict[Tuple[int, int], Set[EntryId]] = {}
+        self._target_ids: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (
+            math.floor(latitude / self._cell_size),
+            math.floor(longitude / self._cell_size),
+        )
+
+    def _unindex(self, entry_id: EntryId, cell: Tuple[int, int]):
+        members = self._cells[cell]
+        members.discard(entry_id)
+        if not members:
+            del self._cells[cell]
+
+    def _update(
+        self,
+        key: str,
+        target_id: str,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        enclosed_at: int,
+        payload: bytes,
+    ):
+        entry_id = (key, target_id)
+        cell = self._cell(latitude, longitude) if latitude is not None else None
+
+        if (entry := self._entries.get(entry_id)) is None:
+            entry = self._entries[entry_id] = _Entry(key, target_id)
+            self._target_ids.setdefault(key, set()).add(target_id)
+        else:
+            self._entries.move_to_end(entry_id)
+
+        if entry.cell != cell:
+            if entry.cell is not None:
+                self._unindex(entry_id, entry.cell)
+            if cell is not None:
+                self._cells.setdefault(cell, set()).add(entry_id)
+            entry.cell = cell
+
+        entry.latitude = latitude
+        entry.longitude = longitude
+        entry.enclosed_at = enclosed_at
+        entry.payload = payload
+        entry.updated_at = time.monotonic()
+
+    def _evict(self, entry_id: EntryId):
+        entry = self._entries.pop(entry_id)
+        if entry.cell is not None:
+            self._unindex(entry_id, entry.cell)
+
+        target_ids = self._target_ids[entry.key]
+        target_ids.discard(entry.target_id)
+        if not target_ids:
+            del self._target_ids[entry.key]
+
+    def update(
+        self,
+        key: str,
+        target_id: str,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        enclosed_at: int,
+        payload: bytes,
+    ):
+        """Insert or update an entry, latitude and longitude are None if unknown."""
+        with self._lock:
+            self._update(key, target_id, latitude, longitude, enclosed_at, payload)
+
+    def replace(
+        self, key: str, prefix: str, positions: Iterable[Position], enclosed_at: int
+    ) -> int:
+        """
+        Update the entries of a key from all positions extracted from a single
+        message, evicting the entries with a target id starting with prefix that
+        are no longer part of the message.
+
+        Returns:
+            evicted (int):
+                The number of evicted entries.
+        """
+        with self._lock:
+            current = set()
+            for target_id, latitude, longitude, payload in positions:
+                self._update(key, target_id, latitude, longitude, enclosed_at, payload)
+                current.add(target_id)
+
+            stale = [
+                target_id
+                for target_id in self._target_ids.get(key, ())
+                if target_id.startswith(prefix) and target_id not in current
+            ]
+            for target_id in stale:
+                self._evict((key, target_id))
+            return len(stale)
+
+    def expire(self) -> int:
+        """Evict expired entries, returning how many were evicted."""
+        deadline = time.monotonic() - self._ttl
+        expired = 0
+        with self._lock:
+            while self._entries:
+                entry_id, entry = next(iter(self._entries.items()))
+                if entry.updated_at > deadline:
+                    break
+                self._evict(entry_id)
+                expired += 1
+        return expired
+
+    def snapshot(self) -> List[CachedTarget]:
+        """All entries that have not expired, including those without position."""
+        deadline = time.monotonic() - self._ttl
+        with self._lock:
+            return [
+                entry.copy()
+                for entry in self._entries.values()
+                if entry.updated_at > deadline
+            ]
+
+    def _columns(self, lon_min: float, lon_max: float) -> List[int]:
+        col_min = self._cell(0, lon_min)[1]
+        col_max = self._cell(0, lon_max)[1]
+        if lon_min <= lon_max:
+            return list(range(col_min, col_max + 1))
+        # Crossing the antimeridian
+        return list(range(col_min, self._cell(0, 180)[1] + 1)) + list(
+            range(self._cell(0, -180)[1], col_max + 1)
+        )
+
+    def _candidates(self, bbox: BoundingBox) -> Iterable[EntryId]:
+        lat_min, lon_min, lat_max, lon_max = bbox
+        rows = range(self._cell(lat_min, 0)[0], self._cell(lat_max, 0)[0] + 1)
+        columns = self._columns(lon_min, lon_max)
+
+        # Visit whichever is fewer, the cells covered by the box or the occupied cells
+        if len(rows) * len(columns) > len(self._cells):
+            columns = set(columns)
+            for (row, col), members in self._cells.items():
+                if row in rows and col in columns:
+                    yield from members
+            return
+
+        for row in rows:
+            for col in columns:
+                yield from self._cells.get((row, col), ())
+
+    def _within_bbox(self, bbox: BoundingBox) -> Iterable[_Entry]:
+        # Must be called with the lock held
+        lat_min, lon_min, lat_max, lon_max = bbox
+        wraps = lon_min > lon_max
+        deadline = time.monotonic() - self._ttl
+
+        for entry_id in self._candidates(bbox):
+            entry = self._entries[entry_id]
+            if entry.updated_at <= deadline:
+                continue
+            if not lat_min <= entry.latitude <= lat_max:
+                continue
+            if wraps:
+                if not (entry.longitude >= lon_min or entry.longitude <= lon_max):
+                    continue
+            elif not lon_min <= entry.longitude <= lon_max:
+                continue
+            yield entry
+
+    def within_bbox(self, bbox: BoundingBox) -> List[CachedTarget]:
+        """Entries within a (lat_min, lon_min, lat_max, lon_max) bounding box."""
+        with self._lock:
+            return [entry.copy() for entry in self._within_bbox(bbox)]
+
+    def within_radius(
+        self, latitude: float, longitude: float, radius_nm: float
+    ) -> List[CachedTarget]:
+        """Entries within radius_nm nautical miles of a position."""
+        # 1 NM is one arc minute of latitude
+        dlat = radius_nm / 60
+        lat_min, lat_max = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+
+        cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+        dlon = radius_nm / (60 * cos_lat) if cos_lat > 1e-9 else 180.0
+
+        if dlon >= 180 or lat_min <= -90 or lat_max >= 90:
+            bbox = (lat_min, -180.0, lat_max, 180.0)
+        else:
+            lon_min = (longitude - dlon + 180) % 360 - 180
+            lon_max = (longitude + dlon + 180) % 360 - 180
+            bbox = (lat_min, lon_min, lat_max, lon_max)
+
+        with self._lock:
+            return [
+                entry.copy()
+                for entry in self._within_bbox(bbox)
+                if haversine_nm(latitude, longitude, entry.latitude, entry.longitude)
+                <= radius_nm
+            ]
@@ -29,17 +29,20 @@ setup(
     author_email="fredrik.x.olsson@ri.se",
     maintainer="Fredrik Olsson",
     maintainer_email="fredrik.x.olsson@ri.se",
-    packages=find_namespace_packages(exclude=["tests", "dist", "build"]),
-    python_requires=">=3.7",
+    packages=find_namespace_packages(exclude=["tests", "benchmarks", "dist", "build"]),
+    python_requires=">=3.10",
     install_requires=[
         "eclipse-zenoh>=1.2.1",
         "protobuf>=5.29.1",
         "pyyaml",
         "parse",
     ],
+    extras_require={
+        "compression": ["zstandard", "lz4"],
+    },
     include_package_data=True,
     package_data={
-        "keelson": ["subjects.yaml"],
+        "keelson": ["subjects.yaml", "procedures.yaml"],
         "keelson.payloads": ["protobuf_file_descriptor_set.bin"],
     },
     entry_points={
@@ -0,0 +1,11 @@
+import pytest
+import zenoh
+
+
+@pytest.fixture
+def session():
+    conf = zenoh.Config()
+    conf.insert_json5("scouting/multicast/enabled", "false")
+    session = zenoh.open(conf)
+    yield session
+    session.close()
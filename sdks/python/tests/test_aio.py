@@ -0,0 +1,210 @@
+import time
+import asyncio
+
+import pytest
+
+import keelson
+from keelson.aio import Session, Subscriber, Publisher
+from keelson.compression import COMPRESSION_ZSTD, CompressionPolicy
+
+from keelson.payloads.Primitives_pb2 import TimestampedFloat
+from keelson.payloads.PointCloud_pb2 import PointCloud
+
+KEY = keelson.construct_pubsub_key("realm", "entity", "rpm", "engine/0")
+
+
+def make_payload(value):
+    payload = TimestampedFloat()
+    payload.timestamp.FromNanoseconds(time.time_ns())
+    payload.value = value
+    return payload
+
+
+def test_publish_subscribe(session):
+    async def main():
+        async with Session(session) as aio_session:
+            subscriber = aio_session.declare_subscriber("realm/v0/entity/pubsub/**")
+            publisher = aio_session.declare_publisher(KEY)
+
+            await publisher.put(make_payload(1.0), enclosed_at=42)
+            return await asyncio.wait_for(anext(subscriber), 1.0)
+
+    sample = asyncio.run(main())
+
+    assert sample.key == KEY
+    assert sample.subject == "rpm"
+    assert sample.source_id == "engine/0"
+    assert sample.enclosed_at == 42
+    assert sample.received_at >= sample.enclosed_at
+    assert sample.payload.value == 1.0
+
+
+def test_unknown_subject_passes_bytes(session):
+    key = keelson.construct_pubsub_key("realm", "entity", "random_mumbo_jumbo", "0")
+
+    async def main():
+        async with Subscriber(session, key) as subscriber:
+            async with Publisher(session, key) as publisher:
+                await publisher.put(b"bytes")
+                return await asyncio.wait_for(anext(subscriber), 1.0)
+
+    assert asyncio.run(main()).payload == b"bytes"
+
+
+def test_invalid_samples_are_dropped(session):
+    async def main():
+        async with Subscriber(session, "realm/**") as subscriber:
+            session.put("realm/not/a/keelson/key", keelson.enclose(b""))
+            session.put(KEY, b"\xff\xff\xff")
+            session.put(KEY, keelson.enclose(make_payload(2.0).SerializeToString()))
+            return await asyncio.wait_for(subscriber.next_batch(), 1.0)
+
+    batch = asyncio.run(main())
+
+    assert len(batch) == 1
+    assert batch[0].payload.value == 2.0
+
+
+def test_next_batch_high_rate(session):
+    count = 5000
+
+    async def main():
+        received = []
+        async with Subscriber(session, KEY, max_queue_size=count) as subscriber:
+            for ix in range(count):
+                session.put(KEY, keelson.enclose(make_payload(ix).SerializeToString()))
+
+            while len(received) < count:
+                batch = await asyncio.wait_for(subscriber.next_batch(500), 1.0)
+                assert len(batch) <= 500
+                received.extend(batch)
+
+        return received
+
+    received = asyncio.run(main())
+
+    assert [sample.payload.value for sample in received] == list(range(count))
+
+
+def test_drops_oldest_when_full(session):
+    async def main():
+        async with Subscriber(session, KEY, max_queue_size=10) as subscriber:
+            for ix in range(20):
+                session.put(KEY, keelson.enclose(make_payload(ix).SerializeToString()))
+            await asyncio.sleep(0.1)
+            return subscriber.dropped, await subscriber.next_batch()
+
+    dropped, batch = asyncio.run(main())
+
+    assert dropped == 10
+    assert [sample.payload.value for sample in batch] == list(range(10, 20))
+
+
+def test_close_stops_iteration(session):
+    async def main():
+        subscriber = Subscriber(session, KEY)
+        received = []
+
+        async def consume():
+            async for sample in subscriber:
+                received.append(sample)
+
+        task = asyncio.create_task(consume())
+        session.put(KEY, keelson.enclose(make_payload(1.0).SerializeToString()))
+        await asyncio.sleep(0.1)
+        subscriber.close()
+        await asyncio.wait_for(task, 1.0)
+        return received
+
+    assert len(asyncio.run(main())) == 1
+
+
+def test_cancellation(session):
+    async def main():
+        async with Subscriber(session, KEY) as subscriber:
+            task = asyncio.create_task(subscriber.next_batch())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            # Still usable after a cancelled wait
+            session.put(KEY, keelson.enclose(make_payload(3.0).SerializeToString()))
+            return await asyncio.wait_for(anext(subscriber), 1.0)
+
+    assert asyncio.run(main()).payload.value == 3.0
+
+
+def test_batched_envelopes_are_unbatched(session):
+    payloads = [(ix + 1, make_payload(ix).SerializeToString()) for ix in range(5)]
+
+    async def main():
+        async with Subscriber(session, KEY) as subscriber:
+            session.put(KEY, keelson.enclose_batch(payloads))
+            return await asyncio.wait_for(subscriber.next_batch(), 1.0)
+
+    batch = asyncio.run(main())
+
+    assert [sample.enclosed_at for sample in batch] == [1, 2, 3, 4, 5]
+    assert [sample.payload.value for sample in batch] == [0, 1, 2, 3, 4]
+
+
+def test_publisher_compression_policy(session):
+    key = keelson.construct_pubsub_key("realm", "entity", "point_cloud", "lidar/0")
+    policy = CompressionPolicy(COMPRESSION_ZSTD, threshold=10)
+    raw = []
+
+    point_cloud = PointCloud()
+    point_cloud.data = b"\x00" * 1000
+
+    async def main():
+        async with Subscriber(session, key) as subscriber:
+            sniffer = session.declare_subscriber(
+                key, lambda sample: raw.append(sample.payload.to_bytes())
+            )
+            async with Publisher(session, key, compression_policy=policy) as publisher:
+                await publisher.put(point_cloud)
+                sample = await asyncio.wait_for(anext(subscriber), 1.0)
+            await asyncio.sleep(0.1)
+            sniffer.undeclare()
+            return sample
+
+    sample = asyncio.run(main())
+
+    assert len(raw[0]) < 1000
+    assert sample.payload.data == point_cloud.data
+
+
+def test_close_after_event_loop_finished(session):
+    async def main():
+        return Subscriber(session, KEY)
+
+    subscriber = asyncio.run(main())
+    subscriber.close()
+
+
+def test_session_close_continues_on_failure(session):
+    async def main():
+        aio_session = Session(session)
+        aio_session.declare_subscriber(KEY)
+        aio_session.declare_publisher(KEY)
+        aio_session.declare_publisher(KEY)
+        return aio_session
+
+    aio_session = asyncio.run(main())
+    declared = list(aio_session._declared)
+    attempted = []
+
+    for entity in declared:
+
+        def fail(entity=entity, close=entity.close):
+            attempted.append(entity)
+            close()
+            raise RuntimeError("Not today")
+
+        entity.close = fail
+
+    aio_session.close()
+
+    assert sorted(map(id, attempted)) == sorted(map(id, declared))
+    assert not aio_session._declared
@@ -0,0 +1,93 @@
+import json
+import time
+
+import pytest
+
+import keelson
+from keelson.batching import Batcher
+from keelson.codec import uncover_to_text, uncover_to_json
+from keelson.payloads.Primitives_pb2 import TimestampedBytes, TimestampedFloat
+
+
+def unbatch(messages):
+    return [
+        (enclosed_at, payload)
+        for message in messages
+        for enclosed_at, _, payload in keelson.uncover_all(message)
+    ]
+
+
+def test_flush_on_count():
+    published = []
+    batcher = Batcher(published.append, max_count=3, max_latency=10)
+
+    for ix in range(7):
+        batcher.add(bytes([ix]), enclosed_at=ix + 1)
+
+    assert len(published) == 2
+    assert unbatch(published) == [(ix + 1, bytes([ix])) for ix in range(6)]
+
+    batcher.close()
+
+    assert len(published) == 3
+    assert unbatch(published)[-1] == (7, bytes([6]))
+
+
+def test_flush_on_bytes():
+    published = []
+    batcher = Batcher(published.append, max_bytes=100, max_latency=10)
+
+    batcher.add(b"x" * 50)
+    assert not published
+
+    batcher.add(b"x" * 50)
+    assert len(published) == 1
+
+
+def test_flush_on_latency():
+    published = []
+    batcher = Batcher(published.append, max_latency=0.05)
+
+    batcher.add(b"test", enclosed_at=42)
+    assert not published
+
+    time.sleep(0.2)
+    assert unbatch(published) == [(42, b"test")]
+
+
+def test_flush_empty_is_noop():
+    published = []
+    batcher = Batcher(published.append)
+    batcher.flush()
+
+    assert not published
+
+
+def test_add_after_close_raises():
+    with Batcher(lambda message: None) as batcher:
+        batcher.add(b"test")
+
+    with pytest.raises(RuntimeError):
+        batcher.add(b"test")
+
+
+def test_codec_decoders_unbatch():
+    raw = []
+    for value in (b"first", b"second"):
+        payload = TimestampedBytes()
+        payload.value = value
+        raw.append((time.time_ns(), payload.SerializeToString()))
+
+    key = keelson.construct_pubsub_key("realm", "entity", "raw", "0")
+    assert uncover_to_text(key, keelson.enclose_batch(raw)) == "first\nsecond"
+    assert uncover_to_text(key, keelson.enclose(raw[0][1])) == "first"
+
+    floats = []
+    for value in (1.0, 2.0):
+        payload = TimestampedFloat()
+        payload.value = value
+        floats.append((time.time_ns(), payload.SerializeToString()))
+
+    key = keelson.construct_pubsub_key("realm", "entity", "rpm", "0")
+    lines = uncover_to_json(key, keelson.enclose_batch(floats)).splitlines()
+    assert [json.loads(line)["value"] for line in lines] == [1.0, 2.0]
@@ -0,0 +1,66 @@
+import pytest
+
+import keelson
+from keelson.compression import (
+    COMPRESSION_NONE,
+    COMPRESSION_ZSTD,
+    COMPRESSION_LZ4,
+    CompressionPolicy,
+    compress,
+    decompress,
+)
+from keelson.Envelope_pb2 import Envelope
+
+PAYLOAD = bytes(range(256)) * 64
+
+
+@pytest.mark.parametrize("codec", [COMPRESSION_ZSTD, COMPRESSION_LZ4])
+def test_compress_decompress(codec):
+    compressed = compress(PAYLOAD, codec)
+
+    assert len(compressed) < len(PAYLOAD)
+    assert decompress(compressed, codec) == PAYLOAD
+
+
+@pytest.mark.parametrize("codec", [COMPRESSION_ZSTD, COMPRESSION_LZ4])
+def test_enclose_uncover_compressed(codec):
+    message = keelson.enclose(PAYLOAD, compression=codec)
+
+    assert Envelope.FromString(message).compression == codec
+    assert len(message) < len(PAYLOAD)
+
+    _, _, payload = keelson.uncover(message)
+    assert payload == PAYLOAD
+
+
+def test_enclose_incompressible_is_sent_as_is():
+    message = keelson.enclose(b"tiny", compression=COMPRESSION_ZSTD)
+
+    assert Envelope.FromString(message).compression == COMPRESSION_NONE
+    assert keelson.uncover(message)[2] == b"tiny"
+
+
+def test_enclose_batch_compressed():
+    payloads = [(ix + 1, PAYLOAD[:100]) for ix in range(50)]
+    message = keelson.enclose_batch(payloads, compression=COMPRESSION_LZ4)
+
+    assert Envelope.FromString(message).compression == COMPRESSION_LZ4
+    assert [
+        (enclosed_at, payload)
+        for enclosed_at, _, payload in keelson.uncover_all(message)
+    ] == payloads
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        compress(PAYLOAD, 42)
+
+
+def test_compression_policy():
+    policy = CompressionPolicy(COMPRESSION_ZSTD, threshold=1024)
+
+    assert policy.select("point_cloud", PAYLOAD) == COMPRESSION_ZSTD
+    assert policy.select("point_cloud", PAYLOAD[:100]) == COMPRESSION_NONE
+    assert policy.select("rpm", PAYLOAD) == COMPRESSION_NONE
+
+    assert CompressionPolicy(subjects=None).select("rpm", PAYLOAD) == COMPRESSION_ZSTD
@@ -0,0 +1,261 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+import keelson
+from keelson.rpc import Responder, Requester, RPCError, _resolve_message_classes
+
+from keelson.payloads.Primitives_pb2 import TimestampedFloat
+from keelson.payloads.SensorPlatform_pb2 import ConfigurationSensorPerception
+
+
+@pytest.fixture(autouse=True)
+def test_procedure(monkeypatch):
+    monkeypatch.setitem(
+        keelson._PROCEDURES,
+        "double",
+        {
+            "description": "Double a value",
+            "schema_input": "keelson.primitives.TimestampedFloat",
+            "schema_output": "keelson.primitives.TimestampedFloat",
+        },
+    )
+
+
+def double(request):
+    response = TimestampedFloat()
+    response.timestamp.FromNanoseconds(request.timestamp.ToNanoseconds())
+    response.value = request.value * 2
+    return response
+
+
+def make_request(value):
+    request = TimestampedFloat()
+    request.timestamp.FromNanoseconds(time.time_ns())
+    request.value = value
+    return request
+
+
+def test_procedure_registry():
+    assert keelson.is_procedure_well_known("double")
+    assert keelson.get_procedure_schemas("double") == (
+        "keelson.primitives.TimestampedFloat",
+        "keelson.primitives.TimestampedFloat",
+    )
+    assert not keelson.is_procedure_well_known("random_mumbo_jumbo")
+
+
+@pytest.mark.parametrize(
+    "procedure", [name for name in keelson._PROCEDURES if name != "double"]
+)
+def test_shipped_procedures_resolve(procedure):
+    schema_in, schema_out = keelson.get_procedure_schemas(procedure)
+    request_class, response_class = _resolve_message_classes(procedure, "none", "none")
+
+    for schema, message_class in (
+        (schema_in, request_class),
+        (schema_out, response_class),
+    ):
+        if schema:
+            assert message_class.DESCRIPTOR.full_name == schema
+        else:
+            assert message_class is None
+
+
+def test_unknown_procedure_schema(monkeypatch, session):
+    monkeypatch.setitem(
+        keelson._PROCEDURES,
+        "broken",
+        {"schema_input": "keelson.random.MumboJumbo", "schema_output": None},
+    )
+
+    with Responder(session, "realm", "entity", "service") as responder:
+        with pytest.raises(ValueError, match="keelson.random.MumboJumbo"):
+            responder.register("broken", double)
+
+    with pytest.raises(ValueError, match="keelson.random.MumboJumbo"):
+        Requester(session, "realm", "entity").call("broken", "service")
+
+
+def test_call_shipped_procedure(session):
+    def apply(request):
+        request.mode = "applied"
+        return request
+
+    request = ConfigurationSensorPerception()
+    request.view_horizontal_angel_deg = 90
+
+    with Responder(session, "realm", "entity", "camera/0") as responder:
+        responder.register("camera_config_apply", apply)
+
+        response = Requester(session, "realm", "entity").call(
+            "camera_config_apply", "camera/0", request
+        )
+
+    assert response.mode == "applied"
+    assert response.view_horizontal_angel_deg == 90
+
+
+def test_call_typed(session):
+    with Responder(session, "realm", "entity", "service") as responder:
+        responder.register("double", double)
+
+        response = Requester(session, "realm", "entity").call(
+            "double", "service", make_request(1.5)
+        )
+
+    assert response.value == 3.0
+
+
+def test_call_coroutine_handler(session):
+    async def handler(request):
+        await asyncio.sleep(0.01)
+        return double(request)
+
+    with Responder(session, "realm", "entity", "service") as responder:
+        responder.register("double", handler)
+
+        response = Requester(session, "realm", "entity").call(
+            "double", "service", make_request(2.0)
+        )
+
+    assert response.value == 4.0
+
+
+def test_call_unknown_procedure_passes_bytes(session):
+    with Responder(session, "realm", "entity", "service") as responder:
+        responder.register("echo", lambda request: request)
+
+        response = Requester(session, "realm", "entity").call(
+            "echo", "service", b"hello"
+        )
+
+    assert response == b"hello"
+
+
+def test_handler_error(session):
+    def handler(request):
+        raise ValueError("Not today")
+
+    with Responder(session, "realm", "entity", "service") as responder:
+        responder.register("double", handler)
+
+        with pytest.raises(RPCError, match="Not today"):
+            Requester(session, "realm", "entity").call(
+                "double", "service", make_request(1.0)
+            )
+
+
+def test_handler_timeout(session):
+    with Responder(session, "realm", "entity", "service") as responder:
+        responder.register("double", lambda request: time.sleep(0.5), timeout=0.05)
+
+        with pytest.raises(RPCError, match="timed out"):
+            Requester(session, "realm", "entity").call(
+                "double", "service", make_request(1.0)
+            )
+
+
+def test_call_no_responder(session):
+    with pytest.raises(TimeoutError):
+        Requester(session, "realm", "entity", timeout=0.2).call(
+            "double", "nobody", make_request(1.0)
+        )
+
+
+def test_call_many(session):
+    responders = [
+        Responder(session, "realm", "entity", f"service/{ix}") for ix in range(3)
+    ]
+    for responder in responders:
+        responder.register("double", double)
+
+    results = Requester(session, "realm", "entity", timeout=0.5).call_many(
+        "double",
+        ["service/0", "service/1", "service/2", "service/missing"],
+        make_request(1.0),
+    )
+
+    for responder in responders:
+        responder.close()
+
+    assert [results[f"service/{ix}"].value for ix in range(3)] == [2.0, 2.0, 2.0]
+    assert isinstance(results["service/missing"], TimeoutError)
+
+
+def test_slow_handlers_run_concurrently(session):
+    def handler(request):
+        time.sleep(0.2)
+        return double(request)
+
+    responders = [
+        Responder(session, "realm", "entity", f"service/{ix}") for ix in range(4)
+    ]
+    for responder in responders:
+        responder.register("double", handler)
+
+    start = time.time()
+    results = Requester(session, "realm", "entity").call_many(
+        "double", [f"service/{ix}" for ix in range(4)], make_request(1.0)
+    )
+    elapsed = time.time() - start
+
+    for responder in responders:
+        responder.close()
+
+    assert all(result.value == 2.0 for result in results.values())
+    assert elapsed < 0.6
+
+
+def test_backpressure(session):
+    release = threading.Event()
+
+    def handler(request):
+        release.wait(1.0)
+        return double(request)
+
+    with Responder(session, "realm", "entity", "service", max_pending=1) as responder:
+        responder.register("double", handler)
+        requester = Requester(session, "realm", "entity")
+
+        first = threading.Thread(
+            target=requester.call, args=("double", "service", make_request(1.0))
+        )
+        first.start()
+        time.sleep(0.1)
+
+        with pytest.raises(RPCError, match="Too many pending requests"):
+            requester.call("double", "service", make_request(1.0))
+
+        release.set()
+        first.join()
+
+
+def test_timed_out_handler_keeps_pending_slot(session):
+    release = threading.Event()
+
+    def handler(request):
+        release.wait(2.0)
+        return double(request)
+
+    with Responder(session, "realm", "entity", "service", max_pending=1) as responder:
+        responder.register("double", handler, timeout=0.05)
+        requester = Requester(session, "realm", "entity")
+
+        with pytest.raises(RPCError, match="timed out"):
+            requester.call("double", "service", make_request(1.0))
+
+        # The handler is still running, so its slot is still taken
+        with pytest.raises(RPCError, match="Too many pending requests"):
+            requester.call("double", "service", make_request(1.0))
+
+        release.set()
+        time.sleep(0.1)
+        release.clear()
+
+        with pytest.raises(RPCError, match="timed out"):
+            requester.call("double", "service", make_request(1.0))
+
+        release.set()
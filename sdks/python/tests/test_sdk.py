@@ -1,4 +1,6 @@
 import time
+
+import pytest
 import keelson
 
 from keelson.payloads.Primitives_pb2 import TimestampedFloat
@@ -166,3 +168,26 @@ def test_rpc_key():
         "subject_out": "subject_out",
         "source_id": "source_id",
     }
+
+
+def test_enclose_batch_uncover_all():
+    payloads = [(1, b"first"), (2, b"second"), (3, b"")]
+    message = keelson.enclose_batch(payloads)
+    uncovered = keelson.uncover_all(message)
+
+    assert [(enclosed_at, payload) for enclosed_at, _, payload in uncovered] == (
+        payloads
+    )
+
+
+def test_uncover_all_single_envelope():
+    message = keelson.enclose(b"test", enclosed_at=42)
+    [(enclosed_at, received_at, payload)] = keelson.uncover_all(message)
+
+    assert enclosed_at == 42
+    assert payload == b"test"
+
+
+def test_uncover_batch_raises():
+    with pytest.raises(ValueError):
+        keelson.uncover(keelson.enclose_batch([(1, b"test")]))
@@ -0,0 +1,232 @@
+import time
+import random
+
+import pytest
+
+from keelson.targets import EXTRACTORS, TRACK_PREFIX, TargetCache, haversine_nm
+from keelson.payloads.AIS_pb2 import AISVessel
+from keelson.payloads.Target_pb2 import Target, Targets, TargetDataSource
+
+KEY = "realm/v0/entity/pubsub/ais_vessel/ais"
+
+
+def ids(entries):
+    return sorted(entry.target_id for entry in entries)
+
+
+def populate(cache, positions):
+    for target_id, (latitude, longitude) in positions.items():
+        cache.update(KEY, target_id, latitude, longitude, 0, b"")
+
+
+def test_bbox():
+    cache = TargetCache()
+    populate(cache, {"a": (57.7, 11.9), "b": (57.75, 11.95), "c": (58.5, 11.9)})
+
+    assert ids(cache.within_bbox((57.6, 11.8, 57.8, 12.0))) == ["a", "b"]
+    assert ids(cache.within_bbox((57.7, 11.9, 57.7, 11.9))) == ["a"]
+    assert ids(cache.within_bbox((10, 10, 11, 11))) == []
+
+
+def test_bbox_across_antimeridian():
+    cache = TargetCache()
+    populate(
+        cache,
+        {
+            "east": (10.0, 179.95),
+            "west": (10.0, -179.95),
+            "edge": (10.0, 180.0),
+            "far": (10.0, 0.5),
+        },
+    )
+
+    assert ids(cache.within_bbox((9, 179.9, 11, -179.9))) == ["east", "edge", "west"]
+    assert ids(cache.within_bbox((9, 179.9, 11, 180))) == ["east", "edge"]
+    assert ids(cache.within_bbox((9, -180, 11, -179.9))) == ["west"]
+
+
+def test_radius_across_antimeridian():
+    cache = TargetCache()
+    populate(cache, {"near": (0.0, -179.98), "far": (0.0, 179.5)})
+
+    assert ids(cache.within_radius(0.0, 179.99, 5)) == ["near"]
+    assert ids(cache.within_radius(0.0, -179.99, 60)) == ["far", "near"]
+
+
+def test_radius_near_pole():
+    cache = TargetCache()
+    populate(cache, {"a": (89.99, 0.0), "b": (89.99, 180.0), "c": (89.0, 0.0)})
+
+    assert ids(cache.within_radius(89.99, 90.0, 5)) == ["a", "b"]
+
+
+@pytest.mark.parametrize("cell_size", [0.01, 0.1, 1.0, 10.0])
+def test_queries_match_brute_force(cell_size):
+    rng = random.Random(42)
+    positions = {
+        str(ix): (rng.uniform(-85, 85), rng.uniform(-180, 180)) for ix in range(2000)
+    }
+    cache = TargetCache(cell_size=cell_size)
+    populate(cache, positions)
+
+    for _ in range(50):
+        latitude, longitude = rng.uniform(-80, 80), rng.uniform(-180, 180)
+        radius_nm = rng.choice([1, 60, 600, 3000])
+        expected = [
+            target_id
+            for target_id, (lat, lon) in positions.items()
+            if haversine_nm(latitude, longitude, lat, lon) <= radius_nm
+        ]
+        assert ids(cache.within_radius(latitude, longitude, radius_nm)) == sorted(
+            expected
+        )
+
+        lat_min, lat_max = sorted(rng.uniform(-85, 85) for _ in range(2))
+        lon_min, lon_max = rng.uniform(-180, 180), rng.uniform(-180, 180)
+        expected = [
+            target_id
+            for target_id, (lat, lon) in positions.items()
+            if lat_min <= lat <= lat_max
+            and (
+                lon_min <= lon <= lon_max
+                if lon_min <= lon_max
+                else lon >= lon_min or lon <= lon_max
+            )
+        ]
+        assert ids(cache.within_bbox((lat_min, lon_min, lat_max, lon_max))) == sorted(
+            expected
+        )
+
+
+def test_moving_between_cells():
+    cache = TargetCache(cell_size=0.1)
+    home, away = (57.6, 11.6, 57.7, 11.7), (57.9, 11.9, 58.0, 12.0)
+
+    cache.update(KEY, "a", 57.65, 11.65, 1, b"first")
+    assert ids(cache.within_bbox(home)) == ["a"]
+
+    cache.update(KEY, "a", 57.95, 11.95, 2, b"second")
+    assert ids(cache.within_bbox(home)) == []
+    (entry,) = cache.within_bbox(away)
+    assert (entry.enclosed_at, entry.payload) == (2, b"second")
+
+    # Losing the position removes it from the spatial index, but not the cache
+    cache.update(KEY, "a", None, None, 3, b"third")
+    assert cache.within_bbox(away) == []
+    assert [entry.payload for entry in cache.snapshot()] == [b"third"]
+    assert len(cache) == 1
+
+
+def test_same_target_id_on_different_keys():
+    cache = TargetCache()
+    cache.update(KEY, "a", 57.7, 11.9, 0, b"")
+    cache.update(KEY + "/other", "a", 57.7, 11.9, 0, b"")
+
+    assert len(cache.within_radius(57.7, 11.9, 1)) == 2
+
+
+def test_expiry():
+    cache = TargetCache(ttl=0.3)
+    populate(cache, {"a": (57.7, 11.9), "b": (57.7, 11.9)})
+
+    time.sleep(0.2)
+    cache.update(KEY, "b", 57.7, 11.9, 1, b"")
+    time.sleep(0.2)
+
+    # Expired entries are excluded even before being evicted...
+    assert ids(cache.snapshot()) == ["b"]
+    assert ids(cache.within_radius(57.7, 11.9, 1)) == ["b"]
+    assert len(cache) == 2
+
+    # ...and evicted from the front of the cache
+    assert cache.expire() == 1
+    assert len(cache) == 1
+
+    time.sleep(0.2)
+    assert cache.expire() == 1
+    assert cache.within_bbox((57, 11, 58, 12)) == []
+    assert len(cache) == 0
+
+
+def test_replace_evicts_lost_tracks():
+    cache = TargetCache()
+    cache.update(KEY, "mmsi/265123456", 57.7, 11.9, 0, b"")
+    cache.update(KEY + "/other", "track/1", 57.7, 11.9, 0, b"")
+
+    positions = [(f"track/{ix}", 57.7, 11.9, b"") for ix in range(3)]
+    assert cache.replace(KEY, TRACK_PREFIX, positions, 1) == 0
+    assert ids(cache.within_radius(57.7, 11.9, 1)) == [
+        "mmsi/265123456",
+        "track/0",
+        "track/1",
+        "track/1",
+        "track/2",
+    ]
+
+    # The track list shrinks, identified targets and other keys are kept
+    assert cache.replace(KEY, TRACK_PREFIX, [("track/0", 57.8, 11.9, b"")], 2) == 2
+    assert ids(cache.snapshot()) == ["mmsi/265123456", "track/0", "track/1"]
+    assert ids(cache.within_bbox((57, 11, 58, 12))) == [
+        "mmsi/265123456",
+        "track/0",
+        "track/1",
+    ]
+    # track/0 moved some 6 NM north
+    assert ids(cache.within_radius(57.7, 11.9, 1)) == ["mmsi/265123456", "track/1"]
+    assert len(cache) == 3
+
+    assert cache.replace(KEY, TRACK_PREFIX, [], 3) == 1
+    assert ids(cache.snapshot()) == ["mmsi/265123456", "track/1"]
+
+
+def test_queries_return_copies():
+    cache = TargetCache()
+    cache.update(KEY, "a", 57.7, 11.9, 1, b"first")
+
+    (before,) = cache.within_radius(57.7, 11.9, 1)
+    cache.update(KEY, "a", 57.8, 11.9, 2, b"second")
+
+    assert before == (KEY, "a", 57.7, 11.9, 1, b"first")
+    assert cache.snapshot()[0] == (KEY, "a", 57.8, 11.9, 2, b"second")
+
+
+def test_extract_targets():
+    message = Targets()
+    for latitude in (57.1, 57.2):
+        target = message.targets.add()
+        target.location.latitude = latitude
+        target.location.longitude = 11.9
+        target.data_source.source.append(TargetDataSource.RADAR_MARINE)
+    identified = message.targets.add()
+    identified.identification.vessel.information.mmsi = 265123456
+    identified.position.latitude_degree = 57.3
+    identified.position.longitude_degree = 11.9
+
+    positions = EXTRACTORS["targets"](message.SerializeToString())
+
+    assert [position[:3] for position in positions] == [
+        ("track/0", 57.1, 11.9),
+        ("track/1", 57.2, 11.9),
+        ("mmsi/265123456", 57.3, 11.9),
+    ]
+    # Each target ends up in a Targets message of its own
+    for position, target in zip(positions, message.targets):
+        assert list(Targets.FromString(position[3]).targets) == [target]
+
+
+def test_extract_ais_vessel_without_position():
+    vessel = AISVessel()
+    vessel.mmsi = 265123456
+    vessel.latitude_degree = 91
+    vessel.longitude_degree = 181
+
+    assert EXTRACTORS["ais_vessel"](vessel.SerializeToString()) == [
+        ("mmsi/265123456", None, None, vessel.SerializeToString())
+    ]
+
+
+def test_extract_target_identities():
+    target = Target()
+    target.identification.vessel.information.call_sign = "SKLM"
+
+    assert EXTRACTORS["target"](target.SerializeToString())[0][0] == "call_sign/SKLM"